@@ -0,0 +1,289 @@
+import os
+import time
+import json
+import subprocess
+
+from experts_calculator import ExpertCalculator, LOG_STAT_OPTION
+from helpers import (
+    merge_blame_objects,
+    parse_email,
+    path_to_filename,
+)
+
+# share of the time budget held back for scoring once work stops
+FINAL_SCORING_FRACTION = 0.1
+
+class AnytimeExpertCalculator(ExpertCalculator):
+    """
+    Calculates expert scores within a fixed time budget, returning the best ranking it has when
+    the deadline hits.
+
+    Work is split into units (one `git blame` per file, one `git log` per author) processed in
+    priority order: files by size or by most recent change, authors by number of commits. The stage
+    that is least complete goes next, so blame and log progress together. Work (including listing
+    and sizing files) stops, and git commands are killed, `FINAL_SCORING_FRACTION` of the budget
+    before the deadline so that final scoring still fits within it.
+    """
+    def __init__(self, directory, git_repo_name, print_logs, num_experts, ranking_constants, ranking_constants_file_name, ranking_number, time_budget, priority='size', stream=False, stream_interval=1.0):
+        super().__init__(directory, git_repo_name, print_logs, num_experts, ranking_constants, ranking_constants_file_name, ranking_number)
+        self.time_budget = time_budget
+        self.priority = priority
+        self.stream = stream
+        self.stream_interval = stream_interval
+        self.start_time = None
+
+
+    ##########################################
+    ########## Scheduling Functions ##########
+    ##########################################
+
+    def calculate_expert_scores_within_budget(self):
+        """
+        Runs blame and log units in priority order until all are done or `time_budget` seconds have passed
+
+        returns OrderedDict {author_email: expert_score}, Object {'blame': float, 'log': float, 'overall': float}
+        """
+        self.start_time = time.time()
+        blame_by_author_obj = {}
+        logs_by_author_obj = {}
+
+        try:
+            num_commits_by_author = self.get_num_commits_by_author_for_directory()
+            file_queue = self.get_prioritized_files()
+        except subprocess.TimeoutExpired:
+            if self.print_logs:
+                print('Time budget ran out before any work was scheduled')
+            if self.num_files_in_dir is None:
+                self.num_files_in_dir = 0
+            return self.calculate_expert_scores(blame_by_author_obj, logs_by_author_obj), self.get_completeness(0, 1, 0, 1)
+
+        author_queue = list(num_commits_by_author.keys())
+        total_file_size = sum(size for f, size in file_queue)
+        total_num_commits = sum(num_commits_by_author.values())
+        processed_file_size = 0
+        processed_num_commits = 0
+        last_stream_time = 0
+
+        while len(file_queue) > 0 or len(author_queue) > 0:
+            blame_fraction = processed_file_size / float(total_file_size) if total_file_size > 0 else 1
+            log_fraction = processed_num_commits / float(total_num_commits) if total_num_commits > 0 else 1
+
+            try:
+                if len(author_queue) == 0 or (len(file_queue) > 0 and blame_fraction <= log_fraction):
+                    f, size = file_queue.pop(0)
+                    merge_blame_objects(blame_by_author_obj, self.get_file_blame_within_budget(f))
+                    processed_file_size += size
+                else:
+                    a = author_queue.pop(0)
+                    logs_by_author_obj[a] = self.get_author_logs_within_budget(a)
+                    processed_num_commits += num_commits_by_author[a]
+            except subprocess.TimeoutExpired:
+                if self.print_logs:
+                    print('Time budget ran out')
+                break
+
+            if self.stream and time.time() - last_stream_time >= self.stream_interval:
+                completeness = self.get_completeness(processed_file_size, total_file_size, processed_num_commits, total_num_commits)
+                self.emit_ranking(self.calculate_expert_scores(blame_by_author_obj, logs_by_author_obj, write_breakdown=False), completeness, False)
+                last_stream_time = time.time()
+
+        expert_scores = self.calculate_expert_scores(blame_by_author_obj, logs_by_author_obj)
+        completeness = self.get_completeness(processed_file_size, total_file_size, processed_num_commits, total_num_commits)
+        if self.stream:
+            self.emit_ranking(expert_scores, completeness, True)
+
+        return expert_scores, completeness
+
+    def get_remaining_time(self):
+        """
+        Seconds left for work, i.e. the budget minus what is held back for final scoring
+
+        returns float
+        """
+        return max(0, self.time_budget * (1 - FINAL_SCORING_FRACTION) - (time.time() - self.start_time))
+
+    def check_remaining_time(self, description):
+        """
+        Raises subprocess.TimeoutExpired if there is no time left for work
+
+        description: String
+        returns None
+        """
+        if self.get_remaining_time() <= 0:
+            raise subprocess.TimeoutExpired(description, 0)
+
+    def run_git_within_budget(self, args, output_file_name):
+        """
+        Runs a git command in the repo, writing stdout to `output_file_name`.
+        Raises subprocess.TimeoutExpired (and kills git) if it would run past the deadline.
+
+        args: [String]
+        output_file_name: String
+        returns None
+        """
+        self.check_remaining_time(args)
+
+        with open(output_file_name, 'w') as file:
+            subprocess.run(['git', '--no-pager'] + args, cwd=self.git_repo_name, stdin=subprocess.DEVNULL, stdout=file, timeout=self.get_remaining_time())
+
+    def get_num_commits_by_author_for_directory(self):
+        """
+        Same as `get_authors_for_directory`, keeping shortlog's commit counts to prioritize authors
+
+        returns OrderedDict {author_email: int} (most commits first)
+        """
+        author_file_name = 'parsed_files/authors.txt'
+        self.run_git_within_budget(['shortlog', '-s', '-n', '-e', '--all', '--no-merges', '--', self.directory], author_file_name)
+
+        num_commits_by_author = {}
+        with open(author_file_name, 'r') as file:
+            for line in file:
+                author_email = parse_email(line)
+                num_commits_by_author[author_email] = num_commits_by_author.get(author_email, 0) + int(line.split()[0])
+
+        return num_commits_by_author
+
+    def get_prioritized_files(self):
+        """
+        Orders files in the directory by `priority`: `size` (largest first) or `recent` (most recently changed first)
+
+        returns [(String, int)] (file, size in bytes)
+        """
+        files_in_dir = self.get_files_in_directory_within_budget()
+        self.num_files_in_dir = len(files_in_dir)
+
+        sizes = {}
+        for f in files_in_dir:
+            self.check_remaining_time('sizing files')
+            sizes[f] = os.path.getsize(f'{self.git_repo_name}/{f}')
+
+        if self.priority == 'recent':
+            last_changed = self.get_last_changed_by_file()
+            sorted_files = sorted(files_in_dir, key=lambda f: (last_changed.get(f, 0), sizes[f]), reverse=True)
+        else:
+            sorted_files = sorted(files_in_dir, key=lambda f: sizes[f], reverse=True)
+
+        return [(f, sizes[f]) for f in sorted_files]
+
+    def get_files_in_directory_within_budget(self):
+        """
+        Same as `get_files_in_directory`, checking the deadline after each directory walked
+
+        returns [String]
+        """
+        files_in_dir = []
+        repo_name_length = len(self.git_repo_name)
+
+        for r, d, f in os.walk(f'{self.git_repo_name}/{self.directory}'):
+            self.check_remaining_time('listing files')
+            for item in f:
+                files_in_dir.append(os.path.join(r, item)[repo_name_length + 1:])
+
+        return files_in_dir
+
+    def get_last_changed_by_file(self):
+        """
+        Commit timestamp of the most recent change to each file in the directory (one `git log` pass)
+
+        returns Object {file: int}
+        """
+        log_file_name = 'parsed_files/last_changed.txt'
+        self.run_git_within_budget(['log', '--format=%ct', '--name-only', '--', self.directory], log_file_name)
+
+        last_changed = {}
+        commit_time = 0
+        with open(log_file_name, 'r') as file:
+            for line in file:
+                line = line.strip()
+                if line.isdigit():
+                    commit_time = int(line)
+                elif line != '' and line not in last_changed.keys():
+                    last_changed[line] = commit_time
+
+        return last_changed
+
+
+    #########################################
+    ########## Work Unit Functions ##########
+    #########################################
+
+    def get_file_blame_within_budget(self, f):
+        """
+        Same as `get_file_blame`, but the blame is killed at the deadline
+
+        f: String
+        returns Object {author_email: {contribution_type: {year: int}}} for this file only
+        """
+        file_name = f'parsed_files/{path_to_filename(f)}_blame.txt'
+        self.run_git_within_budget(['blame', '-e', f], file_name)
+
+        try:
+            return self.parse_current_blame_file(file_name, {})
+        except UnicodeDecodeError as e:
+            if self.print_logs:
+                print(f'{f} has non Unicode characters. Not processing contributions to this file')
+            return {}
+
+    def get_author_logs_within_budget(self, author):
+        """
+        Same as one iteration of `get_logs_for_authors`, but the log is killed at the deadline
+
+        author: String
+        returns [{commit_stats_obj}]
+        """
+        self.run_git_within_budget(['log', LOG_STAT_OPTION, f'--author={author}', '--', self.directory], 'parsed_files/author_log.txt')
+        return self.parse_log_text_to_object(author)
+
+
+    ######################################
+    ########## Output Functions ##########
+    ######################################
+
+    def get_completeness(self, processed_file_size, total_file_size, processed_num_commits, total_num_commits):
+        """
+        Fraction of work done per stage; overall is weighted by `BLAME_SCALAR` and `LOG_SCALAR`
+
+        processed_file_size: int (bytes of files blamed so far)
+        total_file_size: int
+        processed_num_commits: int (commits of authors whose logs were parsed so far)
+        total_num_commits: int
+        returns Object {'blame': float, 'log': float, 'overall': float}
+        """
+        blame_fraction = processed_file_size / float(total_file_size) if total_file_size > 0 else 1
+        log_fraction = processed_num_commits / float(total_num_commits) if total_num_commits > 0 else 1
+        blame_scalar = self.ranking_constants['BLAME_SCALAR']
+        log_scalar = self.ranking_constants['LOG_SCALAR']
+
+        if blame_scalar + log_scalar > 0:
+            overall_fraction = (blame_scalar * blame_fraction + log_scalar * log_fraction) / (blame_scalar + log_scalar)
+        else:
+            overall_fraction = (blame_fraction + log_fraction) / 2
+
+        return {'blame': blame_fraction, 'log': log_fraction, 'overall': overall_fraction}
+
+    def emit_ranking(self, expert_scores, completeness, is_final):
+        """
+        Prints the current top `num_experts` as one JSON line
+
+        expert_scores: OrderedDict {author_email: expert_score}
+        completeness: Object {'blame': float, 'log': float, 'overall': float}
+        is_final: Boolean
+        returns None
+        """
+        print(json.dumps({
+            'elapsed_seconds': round(time.time() - self.start_time, 3),
+            'completeness': {k: round(v, 4) for k, v in completeness.items()},
+            'final': is_final,
+            'experts': [[k, round(v, 4)] for k, v in list(expert_scores.items())[:self.num_experts]],
+        }), flush=True)
+
+    def print_completeness(self, completeness):
+        """
+        Prints how much of the blame and log work finished within the budget
+
+        completeness: Object {'blame': float, 'log': float, 'overall': float}
+        returns None
+        """
+        print(f"Completeness: {round(100 * completeness['overall'], 1)}% "
+              f"(blame {round(100 * completeness['blame'], 1)}%, log {round(100 * completeness['log'], 1)}%) "
+              f"within {self.time_budget}s")
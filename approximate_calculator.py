@@ -0,0 +1,332 @@
+import os
+import math
+import random
+import numpy as np
+
+from experts_calculator import ExpertCalculator, LOG_STAT_OPTION
+from helpers import (
+    get_files_in_directory,
+)
+
+class ApproximateExpertCalculator(ExpertCalculator):
+    """
+    Estimates expert scores from a sample of the directory instead of blaming every file.
+
+    Blame: files are split into at most `num_strata` strata by size and the sample is allocated to
+    strata in proportion to their total size, so large files are sampled more often. Every stratum
+    has at least 2 files and gets at least 2 samples (or is blamed in full), so each one that is
+    sampled contributes to the variance estimate. Every sampled file stands in for `N_h / n_h` files
+    of its stratum when counts are extrapolated.
+
+    Log (optional): for each author, a `commit_sample_rate` fraction of commits (at least one) is
+    fetched with `--stat`. Commit counts are exact (they come from a cheap `git log --format=%H`);
+    insertions, deletions and reviews are scaled by `n_a / m_a`.
+
+    Confidence intervals and top-k stability come from bootstrapping files within strata and
+    sampled commits within authors. Known biases of this estimator:
+        - percentages and normalized components are ratios of estimated totals, which are biased
+          by O(1 / n) for small samples
+        - the naive bootstrap understates a stratum's variance by a factor of (n_h - 1) / n_h,
+          i.e. by half when n_h = 2, so intervals are too narrow when few files are sampled
+        - it also ignores the finite population correction (1 - n_h / N_h), which overstates the
+          variance of strata where a large fraction of files was sampled
+    Treat the intervals and stability as rough guides rather than exact coverage.
+    """
+    def __init__(self, directory, git_repo_name, print_logs, num_experts, ranking_constants, ranking_constants_file_name, ranking_number, sample_rate, commit_sample_rate=None, num_bootstrap=200, num_strata=4, seed=None):
+        super().__init__(directory, git_repo_name, print_logs, num_experts, ranking_constants, ranking_constants_file_name, ranking_number)
+        self.sample_rate = sample_rate
+        self.commit_sample_rate = commit_sample_rate
+        self.num_bootstrap = num_bootstrap
+        self.num_strata = num_strata
+        self.random = random.Random(seed)
+
+        # [{'num_files': N_h, 'sampled_files': [{author_email: {contribution_type: {year: int}}}]}]
+        self.strata = []
+        # {author_email: int} and {author_email: float}, only set when commits are sampled
+        self.total_commits_by_author = {}
+        self.commit_weight_by_author = {}
+
+
+    ################################################
+    ########## Sampling Functions (Blame) ##########
+    ################################################
+
+    def get_current_contributions_per_author(self):
+        """
+        Blames a size-stratified sample of files and extrapolates contributions to the whole directory.
+
+        returns Object {author_email: {contribution_type: {year: float}}}
+        """
+        if self.print_logs:
+            print('Sampling current contributions per author...')
+
+        files_in_dir = get_files_in_directory(self.git_repo_name, self.directory)
+        self.num_files_in_dir = len(files_in_dir)
+
+        self.strata = []
+        for stratum_files, num_samples in self.get_stratified_sample_sizes(files_in_dir):
+            sampled_files = self.random.sample(stratum_files, num_samples)
+            if self.print_logs:
+                print(f'Blaming {num_samples} of {len(stratum_files)} files in stratum')
+
+            self.strata.append({
+                'num_files': len(stratum_files),
+                'sampled_files': [self.get_file_blame(f) for f in sampled_files],
+            })
+
+        return self.extrapolate_blame(self.strata)
+
+    def get_stratified_sample_sizes(self, files_in_dir):
+        """
+        Splits files into strata of similar size and allocates the sample across strata
+        proportionally to each stratum's total size in bytes. Uses fewer strata when there are not
+        enough files for each to hold 2, and gives each stratum at least 2 samples (or all its files).
+        There are no strata when there are no files.
+
+        files_in_dir: [String]
+        returns [([String], int)] (files in stratum, number of files to sample from it)
+        """
+        if len(files_in_dir) == 0:
+            return []
+
+        sizes = {f: os.path.getsize(f'{self.git_repo_name}/{f}') for f in files_in_dir}
+        sorted_files = sorted(files_in_dir, key=lambda f: sizes[f])
+
+        num_strata = max(1, min(self.num_strata, len(sorted_files) // 2))
+        strata = [sorted_files[i * len(sorted_files) // num_strata : (i + 1) * len(sorted_files) // num_strata] for i in range(num_strata)]
+
+        total_size = float(sum(sizes.values())) or 1.0
+        num_samples = max(2 * num_strata, math.ceil(self.sample_rate * len(sorted_files)))
+
+        stratum_sample_sizes = []
+        for stratum_files in strata:
+            stratum_size = sum(sizes[f] for f in stratum_files)
+            n_h = round(num_samples * stratum_size / total_size)
+            stratum_sample_sizes.append((stratum_files, min(len(stratum_files), max(2, n_h))))
+
+        return stratum_sample_sizes
+
+    def extrapolate_blame(self, strata):
+        """
+        Scales each sampled file's counts by `N_h / n_h` and adds them up, skipping strata with no
+        samples. `files_touched_weight` is the estimated number of files in the directory an author touched.
+
+        strata: [{'num_files': int, 'sampled_files': [{author_email: {contribution_type: {year: int}}}]}]
+        returns Object {author_email: {contribution_type: {year: float}}}
+        """
+        blame_by_author_obj = {}
+        for stratum in strata:
+            if len(stratum['sampled_files']) == 0:
+                continue
+
+            weight = stratum['num_files'] / float(len(stratum['sampled_files']))
+            for file_blame_obj in stratum['sampled_files']:
+                for a, obj in file_blame_obj.items():
+                    author_obj = blame_by_author_obj.setdefault(a, {'files_touched': [], 'files_touched_weight': 0})
+                    author_obj['files_touched'].extend(obj['files_touched'])
+                    author_obj['files_touched_weight'] += weight
+
+                    for contribution_type in ['num_lines_contributed', 'num_lines_code_contributed', 'num_lines_comments_contributed']:
+                        totals_by_year = author_obj.setdefault(contribution_type, {})
+                        for year, value in obj[contribution_type].items():
+                            totals_by_year[year] = totals_by_year.get(year, 0) + value * weight
+
+        return blame_by_author_obj
+
+    def get_percent_files_touched_by_author(self, blame_by_author_obj):
+        """
+        Same as `ExpertCalculator.get_percent_files_touched_by_author`, using the extrapolated number of files touched
+
+        blame_by_author_obj: Object {author_email: {contribution_type: {year: float}}}
+        returns Object {author_email: float}
+        """
+        percent_files_touched_by_author = {}
+        num_files_in_dir = float(self.get_num_files_in_directory())
+        for a, obj in blame_by_author_obj.items():
+            percent_files_touched_by_author[a] = obj['files_touched_weight'] / num_files_in_dir
+
+        return percent_files_touched_by_author
+
+
+    ##############################################
+    ########## Sampling Functions (Log) ##########
+    ##############################################
+
+    def get_logs_for_authors(self, authors):
+        """
+        Same as `ExpertCalculator.get_logs_for_authors`, but only fetches `--stat` for a sample of
+        each author's commits when `commit_sample_rate` is set.
+
+        authors: [String]
+        returns Object {author_email: [{commit_stats_obj}]}
+        """
+        if self.commit_sample_rate is None:
+            return super().get_logs_for_authors(authors)
+
+        if self.print_logs:
+            print('Sampling logs for authors.....')
+        logs_by_author_obj = {}
+
+        for a in authors:
+            sha_file_name = 'parsed_files/author_shas.txt'
+            os.system(f'touch {sha_file_name}')
+            cmd = f'cd {self.git_repo_name} && git --no-pager log --format=%H --author={a} {self.directory} > ../{sha_file_name}'
+            os.system(cmd)
+
+            with open(sha_file_name, 'r') as file:
+                commit_shas = [line.strip() for line in file if line.strip() != '']
+
+            if len(commit_shas) == 0:
+                continue
+
+            num_samples = min(len(commit_shas), max(1, round(self.commit_sample_rate * len(commit_shas))))
+            if self.print_logs:
+                print(f'Fetching {num_samples} of {len(commit_shas)} logs for author {a}')
+
+            with open(sha_file_name, 'w') as file:
+                file.write('\n'.join(self.random.sample(commit_shas, num_samples)) + '\n')
+
+            author_file_name = 'parsed_files/author_log.txt'
+            os.system(f'touch {author_file_name}')
+            cmd = f'cd {self.git_repo_name} && git --no-pager log --no-walk {LOG_STAT_OPTION} --stdin {self.directory} < ../{sha_file_name} > ../{author_file_name}'
+            os.system(cmd)
+
+            logs_by_author_obj[a] = self.parse_log_text_to_object(a)
+            self.total_commits_by_author[a] = len(commit_shas)
+            self.commit_weight_by_author[a] = len(commit_shas) / float(num_samples)
+
+        return logs_by_author_obj
+
+    def get_num_commits_by_author(self, logs_by_author_obj):
+        """
+        Same as `ExpertCalculator.get_num_commits_by_author`, with exact total commit counts when commits are sampled
+
+        logs_by_author_obj: Object {author_email: [{commit_stats_obj}]}
+        return Object {author_email: int}, Object {author_email: int}, Object {author_email: float}
+        """
+        num_commits_by_author, num_commits_by_author_last_12_months, percent_commits_by_author_last_12_months = super().get_num_commits_by_author(logs_by_author_obj)
+        for a in num_commits_by_author.keys():
+            num_commits_by_author[a] = self.total_commits_by_author.get(a, num_commits_by_author[a])
+
+        return num_commits_by_author, num_commits_by_author_last_12_months, percent_commits_by_author_last_12_months
+
+    def get_log_code_score_by_author(self, logs_by_author_obj):
+        """
+        Same as `ExpertCalculator.get_log_code_score_by_author`, scaled up by each author's commit sampling weight
+
+        logs_by_author_obj: Object {author_email: [{commit_stats_obj}]}
+        return Object {author_email: float}
+        """
+        log_code_score_by_author = super().get_log_code_score_by_author(logs_by_author_obj)
+        for a in log_code_score_by_author.keys():
+            log_code_score_by_author[a] *= self.commit_weight_by_author.get(a, 1)
+
+        return log_code_score_by_author
+
+    def get_num_reviews_by_author(self, logs_by_author_obj):
+        """
+        When commits are sampled, scales each sampled commit's reviews by its author's sampling weight.
+        Otherwise same as `ExpertCalculator.get_num_reviews_by_author`.
+
+        logs_by_author_obj: Object {author_email: [{commit_stats_obj}]}
+        return Object {author_email: float}
+        """
+        if self.commit_sample_rate is None:
+            return super().get_num_reviews_by_author(logs_by_author_obj)
+
+        num_reviews_by_author = {}
+        for a, stats_arr in logs_by_author_obj.items():
+            for s in stats_arr:
+                for r in s.get('reviewed_by', []):
+                    num_reviews_by_author[r] = num_reviews_by_author.get(r, 0) + self.commit_weight_by_author.get(a, 1)
+
+        return num_reviews_by_author
+
+
+    ###################################################
+    ########## Confidence Interval Functions ##########
+    ###################################################
+
+    def get_confidence_intervals(self, expert_scores, logs_by_author_obj, confidence=0.95):
+        """
+        Bootstraps the sample `num_bootstrap` times to get confidence intervals for each author's
+        expert score and percent of current lines, and how often each of the top `num_experts`
+        stays in the top `num_experts`. Strata that were blamed in full are not resampled.
+
+        expert_scores: OrderedDict {author_email: expert_score} (point estimate)
+        logs_by_author_obj: Object {author_email: [{commit_stats_obj}]}
+        confidence: float
+        returns Object {
+            'scores': {author_email: (low, high)},
+            'percent_lines': {author_email: (estimate, low, high)},
+            'top_k_frequency': {author_email: float},
+            'top_k_stability': float,
+        }
+        """
+        if self.print_logs:
+            print(f'Bootstrapping {self.num_bootstrap} samples...')
+
+        top_k = list(expert_scores.keys())[:self.num_experts]
+        scores_by_author = {a: [] for a in expert_scores.keys()}
+        percent_lines_by_author = {a: [] for a in expert_scores.keys()}
+        top_k_counts = {a: 0 for a in top_k}
+        num_same_top_k = 0
+
+        for i in range(self.num_bootstrap):
+            strata = []
+            for stratum in self.strata:
+                sampled_files = stratum['sampled_files']
+                if len(sampled_files) < stratum['num_files']:
+                    sampled_files = self.random.choices(sampled_files, k=len(sampled_files))
+                strata.append({'num_files': stratum['num_files'], 'sampled_files': sampled_files})
+
+            resampled_logs_by_author_obj = logs_by_author_obj
+            if self.commit_sample_rate is not None:
+                resampled_logs_by_author_obj = {a: self.random.choices(stats_arr, k=len(stats_arr)) for a, stats_arr in logs_by_author_obj.items()}
+
+            blame_by_author_obj = self.extrapolate_blame(strata)
+            percent_lines = self.get_percent_current_code_by_author(blame_by_author_obj, 'num_lines_contributed')
+            scores = self.calculate_expert_scores(blame_by_author_obj, resampled_logs_by_author_obj, write_breakdown=False)
+
+            for a in scores_by_author.keys():
+                scores_by_author[a].append(scores.get(a, 0))
+                percent_lines_by_author[a].append(percent_lines.get(a, 0))
+
+            resampled_top_k = list(scores.keys())[:self.num_experts]
+            for a in top_k:
+                if a in resampled_top_k:
+                    top_k_counts[a] += 1
+            if set(resampled_top_k) == set(top_k):
+                num_same_top_k += 1
+
+        percentiles = [50 * (1 - confidence), 50 * (1 + confidence)]
+        point_percent_lines = self.get_percent_current_code_by_author(self.extrapolate_blame(self.strata), 'num_lines_contributed')
+
+        return {
+            'scores': {a: tuple(np.percentile(v, percentiles)) for a, v in scores_by_author.items()},
+            'percent_lines': {a: (point_percent_lines.get(a, 0),) + tuple(np.percentile(v, percentiles)) for a, v in percent_lines_by_author.items()},
+            'top_k_frequency': {a: c / float(self.num_bootstrap) for a, c in top_k_counts.items()},
+            'top_k_stability': num_same_top_k / float(self.num_bootstrap),
+        }
+
+    def print_approximate_expert_scores(self, expert_scores, confidence_intervals):
+        """
+        Prints top `num_experts` estimated scores with their confidence intervals
+
+        expert_scores: OrderedDict {author_email: expert_score}
+        confidence_intervals: Object (see `get_confidence_intervals`)
+        returns None
+        """
+        print(f'\n---- Top {self.num_experts} Experts (approximate) for {self.ranking_constants_file_name}----')
+
+        i = 0
+        for k, v in expert_scores.items():
+            if i < self.num_experts:
+                low, high = confidence_intervals['scores'][k]
+                percent, percent_low, percent_high = confidence_intervals['percent_lines'][k]
+                print(f'{k} {round(v, 2)} [{round(low, 2)}, {round(high, 2)}] '
+                      f'lines: {round(100 * percent, 1)}% [{round(100 * percent_low, 1)}%, {round(100 * percent_high, 1)}%] '
+                      f'in top {self.num_experts}: {round(100 * confidence_intervals["top_k_frequency"][k])}%')
+            i += 1
+
+        print(f'Top {self.num_experts} unchanged in {round(100 * confidence_intervals["top_k_stability"])}% of {self.num_bootstrap} bootstrap samples')
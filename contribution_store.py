@@ -0,0 +1,356 @@
+import sqlite3
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    num_lines INTEGER
+);
+CREATE TABLE IF NOT EXISTS blame_aggregates (
+    path TEXT NOT NULL,
+    author TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    num_lines_contributed INTEGER NOT NULL,
+    num_lines_code_contributed INTEGER NOT NULL,
+    num_lines_comments_contributed INTEGER NOT NULL,
+    PRIMARY KEY (path, author, year)
+);
+CREATE INDEX IF NOT EXISTS blame_aggregates_author ON blame_aggregates (author, path);
+CREATE INDEX IF NOT EXISTS blame_aggregates_year ON blame_aggregates (year);
+CREATE TABLE IF NOT EXISTS commits (
+    commit_sha TEXT NOT NULL,
+    author TEXT NOT NULL,
+    commit_date TEXT,
+    year INTEGER,
+    num_files_changed INTEGER,
+    num_insertions INTEGER,
+    num_deletions INTEGER,
+    num_lines_commit_msg INTEGER,
+    PRIMARY KEY (commit_sha, author)
+);
+CREATE INDEX IF NOT EXISTS commits_author ON commits (author);
+CREATE INDEX IF NOT EXISTS commits_year ON commits (year);
+CREATE TABLE IF NOT EXISTS commit_paths (
+    path TEXT NOT NULL,
+    commit_sha TEXT NOT NULL,
+    is_file INTEGER NOT NULL,
+    PRIMARY KEY (path, commit_sha)
+);
+CREATE INDEX IF NOT EXISTS commit_paths_commit_sha ON commit_paths (commit_sha);
+CREATE TABLE IF NOT EXISTS commit_reviewers (
+    commit_sha TEXT NOT NULL,
+    reviewer TEXT NOT NULL,
+    PRIMARY KEY (commit_sha, reviewer)
+);
+CREATE INDEX IF NOT EXISTS commit_reviewers_reviewer ON commit_reviewers (reviewer);
+CREATE TABLE IF NOT EXISTS line_ownership (
+    path TEXT NOT NULL,
+    line_number INTEGER NOT NULL,
+    author TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    is_code INTEGER NOT NULL,
+    PRIMARY KEY (path, line_number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS indexed_files (
+    path TEXT PRIMARY KEY,
+    blob_sha TEXT
+);
+CREATE TABLE IF NOT EXISTS expertise_scores (
+    ranking_constants TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    author TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (ranking_constants, directory, author)
+);
+"""
+
+CONTRIBUTION_TYPES = ['num_lines_contributed', 'num_lines_code_contributed', 'num_lines_comments_contributed']
+
+def prefix_clause(column, directory):
+    """
+    Builds a WHERE clause matching `directory` and everything under it. Uses a range instead of
+    LIKE so that SQLite can answer it from the index on `column` ('0' is the character after '/').
+
+    column: String
+    directory: String
+    returns String, [String]
+    """
+    directory = (directory or '').strip('/')
+    if directory == '':
+        return '1 = 1', []
+
+    return f'({column} = ? OR ({column} >= ? AND {column} < ?))', [directory, f'{directory}/', f'{directory}0']
+
+class ContributionStore:
+    """
+    Optional SQLite backend for parsed git data. Holds per-file blame aggregates (the counts
+    `parse_current_blame_file` computes), the author of every current line, and per-commit log
+    stats, so that scoring and ad-hoc analysis can run from the database without touching git again.
+    Expert scores computed from the store can be cached in it too; any new blame or log write clears them.
+
+    Writes are not committed until `commit` is called.
+    """
+    def __init__(self, db_file_name):
+        self.db_file_name = db_file_name
+        self.connection = sqlite3.connect(db_file_name)
+        self.connection.executescript(SCHEMA)
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+    ############################
+    ########## Writes ##########
+    ############################
+
+    def clear_files(self, directory):
+        """
+        Deletes blame aggregates and line ownership for every file under `directory`, so that files
+        deleted since the last run do not linger once the directory is blamed again
+
+        directory: String
+        returns None
+        """
+        clause, params = prefix_clause('path', directory)
+        self.connection.execute('DELETE FROM expertise_scores')
+        for table in ['files', 'blame_aggregates', 'line_ownership', 'indexed_files']:
+            self.connection.execute(f'DELETE FROM {table} WHERE {clause}', params)
+
+    def write_file_blame(self, path, file_blame_obj, num_lines):
+        """
+        Replaces blame aggregates for one file
+
+        path: String (relative to the root of the git repo)
+        file_blame_obj: Object {author_email: {contribution_type: {year: int}}} for this file only
+        num_lines: int, or None if the file could not be parsed
+        returns None
+        """
+        self.connection.execute('DELETE FROM expertise_scores')
+        self.connection.execute('DELETE FROM blame_aggregates WHERE path = ?', [path])
+        self.connection.execute('INSERT OR REPLACE INTO files (path, num_lines) VALUES (?, ?)', [path, num_lines])
+
+        rows = []
+        for a, obj in file_blame_obj.items():
+            for year in obj['num_lines_contributed'].keys():
+                rows.append([path, a, int(year)] + [obj[t].get(year, 0) for t in CONTRIBUTION_TYPES])
+
+        self.connection.executemany('INSERT INTO blame_aggregates VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def write_line_owners(self, path, line_owners, blob_sha):
+        """
+        Replaces the line ownership index for one file. The file is marked as indexed at `blob_sha`
+        even if it has no lines (empty or not parseable), so that it is only blamed again once it changes.
+
+        path: String (relative to the root of the git repo)
+        line_owners: [(author_email, year, is_code)], one per line in file order
+        blob_sha: String (the file's blob in the blamed commit)
+        returns None
+        """
+        self.connection.execute('INSERT OR REPLACE INTO indexed_files (path, blob_sha) VALUES (?, ?)', [path, blob_sha])
+        self.connection.execute('DELETE FROM line_ownership WHERE path = ?', [path])
+        self.connection.executemany(
+            'INSERT INTO line_ownership VALUES (?, ?, ?, ?, ?)',
+            [[path, i + 1, a, int(year), is_code] for i, (a, year, is_code) in enumerate(line_owners)]
+        )
+
+    def write_logs(self, logs_by_author_obj, directory):
+        """
+        Upserts per-commit log stats. Each commit is also recorded under `directory`, since the
+        log was collected for it, so directory queries find commits whose file list was not parsed.
+
+        logs_by_author_obj: Object {author_email: [{commit_stats_obj}]}
+        directory: String
+        returns None
+        """
+        directory = (directory or '').strip('/')
+        self.connection.execute('DELETE FROM expertise_scores')
+        for a, stats_arr in logs_by_author_obj.items():
+            for s in stats_arr:
+                if 'commit_sha' not in s.keys():
+                    continue
+
+                commit_date = s.get('commit_date')
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    [
+                        s['commit_sha'],
+                        a,
+                        commit_date.isoformat() if commit_date else None,
+                        commit_date.year if commit_date else None,
+                        s.get('num_files_changed'),
+                        s.get('num_insertions'),
+                        s.get('num_deletions'),
+                        s.get('num_lines_commit_msg'),
+                    ]
+                )
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO commit_paths VALUES (?, ?, 1)',
+                    [[f, s['commit_sha']] for f in s.get('files_changed', [])]
+                )
+                self.connection.execute('INSERT OR IGNORE INTO commit_paths VALUES (?, ?, 0)', [directory, s['commit_sha']])
+                self.connection.executemany(
+                    'INSERT OR IGNORE INTO commit_reviewers VALUES (?, ?)',
+                    [[s['commit_sha'], r] for r in s.get('reviewed_by', [])]
+                )
+
+
+    def write_expertise_scores(self, ranking_constants, directory, expert_scores):
+        """
+        Caches expert scores for a directory
+
+        ranking_constants: String (serialized ranking constants the scores were calculated with)
+        directory: String
+        expert_scores: Object {author_email: expert_score}
+        returns None
+        """
+        self.connection.execute('DELETE FROM expertise_scores WHERE ranking_constants = ? AND directory = ?', [ranking_constants, directory])
+        self.connection.executemany(
+            'INSERT INTO expertise_scores VALUES (?, ?, ?, ?)',
+            [[ranking_constants, directory, a, score] for a, score in expert_scores.items()]
+        )
+
+
+    ###########################
+    ########## Reads ##########
+    ###########################
+
+    def get_expertise_scores(self, ranking_constants, directory):
+        """
+        Cached expert scores for a directory, or None if they have not been cached (or were cleared)
+
+        ranking_constants: String
+        directory: String
+        returns Object {author_email: expert_score} or None
+        """
+        cursor = self.connection.execute(
+            'SELECT author, score FROM expertise_scores WHERE ranking_constants = ? AND directory = ?',
+            [ranking_constants, directory]
+        )
+        expert_scores = {author: score for author, score in cursor}
+
+        return expert_scores if len(expert_scores) > 0 else None
+
+    def get_num_files(self, directory):
+        """
+        Number of files under `directory` that have been blamed into the store
+
+        directory: String
+        returns int
+        """
+        clause, params = prefix_clause('path', directory)
+        return self.connection.execute(f'SELECT COUNT(*) FROM files WHERE {clause}', params).fetchone()[0]
+
+    def has_line_owners(self, path):
+        """
+        Whether the line ownership index has been built for a file (it may have no lines)
+
+        path: String
+        returns Boolean
+        """
+        return self.connection.execute('SELECT 1 FROM indexed_files WHERE path = ?', [path]).fetchone() is not None
+
+    def get_indexed_blob_sha(self, path):
+        """
+        Blob the line ownership index of a file was built from
+
+        path: String
+        returns String, or None if the file is not indexed
+        """
+        row = self.connection.execute('SELECT blob_sha FROM indexed_files WHERE path = ?', [path]).fetchone()
+        return row[0] if row is not None else None
+
+    def get_line_range_blame_by_author(self, path, start_line=None, end_line=None):
+        """
+        Builds a blame object (same shape as `get_blame_by_author`) for lines `start_line` to
+        `end_line` (inclusive, 1-indexed) of one file, from the line ownership index
+
+        path: String
+        start_line: int, or None for the start of the file
+        end_line: int, or None for the end of the file
+        returns Object {author_email: {contribution_type: {year: int}}}
+        """
+        cursor = self.connection.execute("""
+            SELECT author, year, COUNT(*), SUM(is_code) FROM line_ownership
+            WHERE path = ? AND line_number >= ? AND line_number <= ? GROUP BY author, year
+        """, [path, start_line or 1, end_line or 2 ** 62])
+
+        blame_by_author_obj = {}
+        for author, year, num_lines, num_lines_code in cursor:
+            obj = blame_by_author_obj.setdefault(author, {t: {} for t in CONTRIBUTION_TYPES})
+            obj['num_lines_contributed'][str(year)] = num_lines
+            obj['num_lines_code_contributed'][str(year)] = num_lines_code
+            obj['num_lines_comments_contributed'][str(year)] = num_lines - num_lines_code
+            obj['files_touched'] = [path]
+
+        return blame_by_author_obj
+
+    def get_blame_by_author(self, directory):
+        """
+        Rebuilds `get_current_contributions_per_author` output for `directory` from stored aggregates.
+        `files_touched` holds repo-relative paths rather than parsed blame file names.
+
+        directory: String
+        returns Object {author_email: {contribution_type: {year: int}}}
+        """
+        clause, params = prefix_clause('path', directory)
+        blame_by_author_obj = {}
+
+        cursor = self.connection.execute(f"""
+            SELECT author, year, SUM(num_lines_contributed), SUM(num_lines_code_contributed), SUM(num_lines_comments_contributed)
+            FROM blame_aggregates WHERE {clause} GROUP BY author, year
+        """, params)
+        for row in cursor:
+            obj = blame_by_author_obj.setdefault(row[0], {t: {} for t in CONTRIBUTION_TYPES})
+            for t, value in zip(CONTRIBUTION_TYPES, row[2:]):
+                obj[t][str(row[1])] = value
+
+        for a, obj in blame_by_author_obj.items():
+            obj['files_touched'] = []
+        cursor = self.connection.execute(f'SELECT DISTINCT author, path FROM blame_aggregates WHERE {clause}', params)
+        for author, path in cursor:
+            blame_by_author_obj[author]['files_touched'].append(path)
+
+        return blame_by_author_obj
+
+    def get_logs_by_author(self, directory):
+        """
+        Rebuilds `get_logs_for_authors` output for `directory` from stored commits.
+        `files_changed` only holds files under `directory`. Insertion and deletion counts are those
+        of the directory the log was originally collected for, which may be a parent of `directory`.
+
+        directory: String
+        returns Object {author_email: [{commit_stats_obj}]}
+        """
+        clause, params = prefix_clause('path', directory)
+        commit_shas_sql = f'SELECT commit_sha FROM commit_paths WHERE {clause}'
+
+        files_changed_by_sha = {}
+        cursor = self.connection.execute(f'SELECT commit_sha, path FROM commit_paths WHERE is_file = 1 AND {clause}', params)
+        for sha, path in cursor:
+            files_changed_by_sha.setdefault(sha, []).append(path)
+
+        reviewed_by_sha = {}
+        cursor = self.connection.execute(f'SELECT commit_sha, reviewer FROM commit_reviewers WHERE commit_sha IN ({commit_shas_sql})', params)
+        for sha, reviewer in cursor:
+            reviewed_by_sha.setdefault(sha, []).append(reviewer)
+
+        logs_by_author_obj = {}
+        cursor = self.connection.execute(f"""
+            SELECT commit_sha, author, commit_date, num_files_changed, num_insertions, num_deletions, num_lines_commit_msg
+            FROM commits WHERE commit_sha IN ({commit_shas_sql}) ORDER BY commit_date DESC
+        """, params)
+        for row in cursor:
+            commit_obj = {'commit_sha': row[0]}
+            if row[2] is not None:
+                commit_obj['commit_date'] = datetime.fromisoformat(row[2])
+            for key, value in zip(['num_files_changed', 'num_insertions', 'num_deletions', 'num_lines_commit_msg'], row[3:]):
+                if value is not None:
+                    commit_obj[key] = value
+            commit_obj['reviewed_by'] = reviewed_by_sha.get(row[0], [])
+            commit_obj['files_changed'] = files_changed_by_sha.get(row[0], [])
+            logs_by_author_obj.setdefault(row[1], []).append(commit_obj)
+
+        return logs_by_author_obj
@@ -9,15 +9,21 @@ from helpers import (
     parse_log_value,
     get_files_in_directory,
     parse_email,
+    parse_stat_path,
     parse_year,
     normalize_dictionary,
+    merge_blame_objects,
     sort_dict_by_value,
     path_to_filename,
     mkdir_not_exists,
 )
+from reviewer_index import ReviewerIndex
+
+# wide enough that `git log --stat` never shortens paths to `.../dir/file`
+LOG_STAT_OPTION = '--stat=1000'
 
 class ExpertCalculator:
-    def __init__(self, directory, git_repo_name, print_logs, num_experts, ranking_constants, ranking_constants_file_name, ranking_number):
+    def __init__(self, directory, git_repo_name, print_logs, num_experts, ranking_constants, ranking_constants_file_name, ranking_number, store=None):
         self.directory = directory
         self.git_repo_name = git_repo_name
         self.print_logs = print_logs
@@ -25,6 +31,9 @@ class ExpertCalculator:
         self.ranking_constants = ranking_constants
         self.ranking_constants_file_name = ranking_constants_file_name
         self.ranking_number = ranking_number
+        self.store = store
+        self.num_files_in_dir = None
+        self.reviewer_index = None
 
 
     #############################################
@@ -42,28 +51,65 @@ class ExpertCalculator:
             print('Getting current contributions per author...')
 
         files_in_dir = get_files_in_directory(self.git_repo_name, self.directory)
+        self.num_files_in_dir = len(files_in_dir)
 
-        for f in files_in_dir:
-            formatted_file_name = path_to_filename(f)
-            file_name = f'parsed_files/{formatted_file_name}_blame.txt'
-            os.system(f'touch {file_name}')
-
-            cmd = f'cd {self.git_repo_name} && git --no-pager blame -e {f} > ../{file_name}'
-            os.system(cmd)
+        if self.store is not None:
+            self.store.clear_files(self.directory)
 
         blame_by_author_obj = {}
         for f in files_in_dir:
-            formatted_file_name = path_to_filename(f)
-            file_name = f'parsed_files/{formatted_file_name}_blame.txt'
+            merge_blame_objects(blame_by_author_obj, self.get_file_blame(f))
 
-            try:
-                blame_by_author_obj.update(self.parse_current_blame_file(file_name, blame_by_author_obj))
-            except UnicodeDecodeError as e:
-                if self.print_logs:
-                    print(f'{f} has non Unicode characters. Not processing contributions to this file')
+        if self.store is not None:
+            self.store.commit()
 
         return blame_by_author_obj
 
+    def get_file_blame(self, f):
+        """
+        Runs `git blame` on one file and parses its contributions (also written to `store`, if any).
+        Nothing is written if the blame fails, e.g. because the file is not tracked.
+
+        f: String (relative to the root of the git repo)
+        returns Object {author_email: {contribution_type: {year: int}}} for this file only
+        """
+        formatted_file_name = path_to_filename(f)
+        file_name = f'parsed_files/{formatted_file_name}_blame.txt'
+        os.system(f'touch {file_name}')
+
+        cmd = f'cd {self.git_repo_name} && git --no-pager blame -e {f} > ../{file_name}'
+        if os.system(cmd) != 0:
+            if self.print_logs:
+                print(f'git blame failed for {f}. Not processing contributions to this file')
+            return {}
+
+        try:
+            file_blame_obj = self.parse_current_blame_file(file_name, {})
+            num_lines = sum(sum(obj['num_lines_contributed'].values()) for obj in file_blame_obj.values())
+            line_owners = self.parse_blame_line_owners(file_name)
+        except UnicodeDecodeError as e:
+            if self.print_logs:
+                print(f'{f} has non Unicode characters. Not processing contributions to this file')
+            file_blame_obj = {}
+            num_lines = None
+            line_owners = []
+
+        if self.store is not None:
+            self.store.write_file_blame(f, file_blame_obj, num_lines)
+            self.store.write_line_owners(f, line_owners, self.get_blob_sha(f))
+
+        return file_blame_obj
+
+    def parse_blame_line_owners(self, file_name):
+        """
+        Parses who owns each line of a blame dump, for the line ownership index
+
+        file_name: String
+        returns [(author_email, year, is_code)]
+        """
+        with open(file_name, 'r') as file:
+            return [(parse_email(line), parse_year(line), is_code(line)) for line in file]
+
     def parse_current_blame_file(self, file_name, blame_by_author_obj):
         """
         Helper function for `get_current_contributions_per_author` to parse
@@ -157,19 +203,131 @@ class ExpertCalculator:
             # store authors' commit history in temp text file
             author_file_name = 'parsed_files/author_log.txt'
             os.system(f'touch {author_file_name}')
-            cmd = f'cd {self.git_repo_name} && git --no-pager log --stat --author={a} {self.directory} > ../{author_file_name}'
+            cmd = f'cd {self.git_repo_name} && git --no-pager log {LOG_STAT_OPTION} --author={a} {self.directory} > ../{author_file_name}'
             os.system(cmd)
 
             current_author_commits = self.parse_log_text_to_object(a)
             logs_by_author_obj[a] = current_author_commits
+
+        if self.store is not None:
+            self.store.write_logs(logs_by_author_obj, self.directory)
+            self.store.commit()
         
         return logs_by_author_obj
 
+    def load_contributions_from_store(self):
+        """
+        Pulls blame and log aggregates for this directory from `store` instead of running git
+
+        returns Object {author_email: {contribution_type: {year: int}}}, Object {author_email: [{commit_stats_obj}]}
+        """
+        if self.print_logs:
+            print(f'Loading contributions from {self.store.db_file_name}...')
+
+        blame_by_author_obj = self.store.get_blame_by_author(self.directory)
+        logs_by_author_obj = self.store.get_logs_by_author(self.directory)
+        self.num_files_in_dir = self.store.get_num_files(self.directory)
+
+        return blame_by_author_obj, logs_by_author_obj
+
+    def update_reviewer_index_with_new_commits(self):
+        """
+        Brings the reviewer index for this directory up to HEAD by fetching only the commits made since
+        it (or a parent) was last indexed: a single `git log` for all authors, or none if HEAD has not
+        moved. The directory is re-indexed from scratch if a sub-directory was indexed on its own or
+        history was rewritten, so that no commit is counted twice.
+
+        returns None
+        """
+        head_sha = self.get_head_sha()
+        reviewer_index = self.get_reviewer_index()
+        last_indexed_sha = reviewer_index.get_last_indexed_sha(self.directory)
+        if last_indexed_sha == head_sha:
+            return
+
+        revision_range = 'HEAD'
+        if last_indexed_sha is not None and not reviewer_index.has_indexed_sub_directories(self.directory) and \
+                os.system(f'cd {self.git_repo_name} && git merge-base --is-ancestor {last_indexed_sha} HEAD 2> /dev/null') == 0:
+            revision_range = f'{last_indexed_sha}..HEAD'
+        else:
+            reviewer_index.clear(self.directory)
+
+        if self.print_logs:
+            print(f'Fetching logs for {revision_range}...')
+
+        author_file_name = 'parsed_files/author_log.txt'
+        os.system(f'touch {author_file_name}')
+        cmd = f'cd {self.git_repo_name} && git --no-pager log {LOG_STAT_OPTION} {revision_range} -- {self.directory} > ../{author_file_name}'
+        os.system(cmd)
+
+        logs_by_author_obj = {}
+        for s in self.parse_log_text_to_object(None):
+            if 'author_email' in s.keys():
+                logs_by_author_obj.setdefault(s['author_email'], []).append(s)
+
+        num_updated_commits = reviewer_index.update(logs_by_author_obj, self.directory)
+        reviewer_index.set_last_indexed_sha(self.directory, head_sha)
+        reviewer_index.save()
+
+        if self.print_logs:
+            print(f'Added {num_updated_commits} reviewed commits to reviewer index')
+
+    def get_reviewer_index_from_store(self):
+        """
+        Builds a reviewer index for this directory from the commits in `store`, without running git.
+        It is not persisted, since the store has no HEAD to resume from.
+
+        returns ReviewerIndex
+        """
+        reviewer_index = ReviewerIndex(None)
+        reviewer_index.update(self.store.get_logs_by_author(self.directory), self.directory)
+
+        return reviewer_index
+
+    def get_blob_sha(self, path):
+        """
+        Blob of a file at HEAD, which changes whenever the file's contents do
+
+        path: String (relative to the root of the git repo)
+        returns String, or None if the file is not in HEAD
+        """
+        blob_file_name = 'parsed_files/blob.txt'
+        os.system(f'touch {blob_file_name}')
+        if os.system(f'cd {self.git_repo_name} && git rev-parse --verify --quiet HEAD:{path} > ../{blob_file_name}') != 0:
+            return None
+
+        with open(blob_file_name, 'r') as file:
+            return file.read().strip()
+
+    def get_head_sha(self):
+        """
+        Current HEAD commit of the git repo
+
+        returns String
+        """
+        head_file_name = 'parsed_files/head.txt'
+        os.system(f'touch {head_file_name}')
+        os.system(f'cd {self.git_repo_name} && git rev-parse HEAD > ../{head_file_name}')
+
+        with open(head_file_name, 'r') as file:
+            return file.read().strip()
+
+    def get_reviewer_index(self):
+        """
+        Loads the reviewer index for this repo on first use
+
+        returns ReviewerIndex
+        """
+        if self.reviewer_index is None:
+            self.reviewer_index = ReviewerIndex.load(f'parsed_files/{self.git_repo_name}_reviewer_index.json')
+
+        return self.reviewer_index
+
     def parse_log_text_to_object(self, author):
         """
         Parses an author's commit history (from text file to array of objects)
 
-        author: String
+        author: String (or None when the log covers every author; see `author_email` on each commit)
         returns [{commit_stats_obj}]
         """
         current_author_commits = []
@@ -213,10 +371,14 @@ class ExpertCalculator:
                 elif line.startswith('Change-Id:') or (line.startswith(self.directory) and in_commit_msg == True):
                     curr_commit_obj['num_lines_commit_msg'] = num_lines_commit_msg
                     in_commit_msg = False # commit message ends before change id
+                    if line.startswith(self.directory) and ' | ' in line:
+                        files_changed.append(parse_stat_path(line))
                 elif line.startswith(self.directory):
-                    files_changed.append(line.split()[0])
+                    files_changed.append(parse_stat_path(line))
                 elif in_commit_msg:
                     num_lines_commit_msg += 1
+                elif line.startswith('Author:'):
+                    curr_commit_obj['author_email'] = parse_email(line)
                 elif line.startswith('Reviewed-by:'):
                     reviewed_by_string = parse_log_value(line, 'Reviewed-by:')
                     reviewed_by_email = parse_email(reviewed_by_string)
@@ -233,6 +395,9 @@ class ExpertCalculator:
                             curr_commit_obj['num_deletions'] = num_changes
             
             # cover last commit case
+            if curr_commit_obj != {}:
+                curr_commit_obj['reviewed_by'] = reviewed_by_emails
+                curr_commit_obj['files_changed'] = files_changed
             current_author_commits.append(curr_commit_obj)
         
         return current_author_commits
@@ -242,7 +407,7 @@ class ExpertCalculator:
     ########## Heuristic Functions (Blame) ##########
     #################################################
 
-    def get_blame_metrics(self, blame_by_author_obj):
+    def get_blame_metrics(self, blame_by_author_obj, write_breakdown=True):
         """
         Combines 3 top-level blame metrics into one blame_score per author. Because blame looks 
         at the codebase's *current* state, these metrics do not reflect any historical changes
@@ -252,6 +417,7 @@ class ExpertCalculator:
             - percent_files_touched
         
         blame_by_author_obj: Object {author_email: {contribution_type: {year: int}}}
+        write_breakdown: Boolean (append each component to `score_breakdown_<ranking_number>.txt`)
         returns Object {author_email: blame_score}
         """
         percent_lines_contributed_by_author_stats = self.get_percent_current_code_by_author(blame_by_author_obj, 'num_lines_contributed')
@@ -264,6 +430,9 @@ class ExpertCalculator:
                                                 self.ranking_constants['BLAME_CODE_SCORE_SCALAR'] * score_current_code_by_author_and_recency.get(a, 0) + \
                                                 self.ranking_constants['FILES_TOUCHED_SCALAR'] * percent_files_touched_by_author.get(a, 0)
             
+            if not write_breakdown:
+                continue
+
             with open(f'score_breakdown_{self.ranking_number}.txt', 'a') as file:
                 # file.write(self.ranking_constants_file_name)
                 file.write(f"{a}: LINES_CONTRIBUTED_SCALAR = {self.ranking_constants['LINES_CONTRIBUTED_SCALAR'] * percent_lines_contributed_by_author_stats.get(a, 0)}\n")
@@ -304,6 +473,9 @@ class ExpertCalculator:
         contribution_type: String (one of `num_lines_contributed`, `num_lines_code_contributed`, `num_lines_comments_contributed`)
         return Object {author_email: normalized_score_value}
         """
+        if self.get_total_lines_in_directory(blame_by_author_obj, contribution_type) == 0:
+            return {}
+
         average_contribution_year = int(self.get_average_contribution_year(blame_by_author_obj, contribution_type))
 
         score_by_author_obj = {}
@@ -325,12 +497,23 @@ class ExpertCalculator:
         returns Object {author_email: float}
         """
         percent_files_touched_by_author = {}
-        num_files_in_dir = float(len(get_files_in_directory(self.git_repo_name, self.directory)))
+        num_files_in_dir = float(self.get_num_files_in_directory())
         for a, obj in blame_by_author_obj.items():
             percent_files_touched_by_author[a] = len(obj['files_touched']) / num_files_in_dir
         
         return percent_files_touched_by_author
 
+    def get_num_files_in_directory(self):
+        """
+        Number of files in the directory. Cached, and taken from `store` when contributions were loaded from it.
+
+        return int
+        """
+        if self.num_files_in_dir is None:
+            self.num_files_in_dir = len(get_files_in_directory(self.git_repo_name, self.directory))
+
+        return self.num_files_in_dir
+
     def get_average_contribution_year(self, blame_by_author_obj, contribution_type):
         """
         Determines the year that the average line of *current* code was committed (to be used in recency heuristics)
@@ -392,11 +575,12 @@ class ExpertCalculator:
     ########## Heuristic Functions (Log) ##########
     ###############################################
 
-    def get_log_metrics(self, logs_by_author_obj):
+    def get_log_metrics(self, logs_by_author_obj, write_breakdown=True):
         """
         Calculates log_score for each author.
 
         logs_by_author_obj: Object {author_email: [{commit_stats_obj}]}
+        write_breakdown: Boolean (append each component to `score_breakdown_<ranking_number>.txt`)
         return Object {author_email: log_score}
         """
         final_log_score_by_author = {}
@@ -419,6 +603,9 @@ class ExpertCalculator:
                                            self.ranking_constants['LOG_CODE_SCORE_SCALAR'] *  normalized_log_code_score_by_author.get(a, 0) + \
                                            self.ranking_constants['NUM_REVIEWS_SCALAR'] * normalized_num_reviews_by_author.get(a, 0)
             
+            if not write_breakdown:
+                continue
+
             with open(f'score_breakdown_{self.ranking_number}.txt', 'a') as file:
                 # file.write(self.ranking_constants_file_name)
                 file.write(f"{a}: NUM_COMMMITS_SCALAR = {self.ranking_constants['NUM_COMMMITS_SCALAR'] * normalized_num_commits_by_author.get(a, 0)}\n")
@@ -495,22 +682,26 @@ class ExpertCalculator:
     ########## Final Calculation Functions ##########
     #################################################
 
-    def calculate_expert_scores(self, blame_by_author_obj, logs_by_author_obj):
+    def calculate_expert_scores(self, blame_by_author_obj, logs_by_author_obj, write_breakdown=True):
         """
         Calculates expert score for each author as a combination of blame_score and log_score that are
         weighted with config scalars `BLAME_SCALAR` and `LOG_SCALAR`.
 
         blame_by_author_obj: Object {author_email: {contribution_type: {year: int}}}
         logs_by_author_obj: Object {author_email: [{commit_stats_obj}]}
+        write_breakdown: Boolean (append each component to `score_breakdown_<ranking_number>.txt`)
         return Object {author_email: expert_score}
         """
-        final_blame_score_by_author = self.get_blame_metrics(blame_by_author_obj)
-        final_log_score_by_author = self.get_log_metrics(logs_by_author_obj)
+        final_blame_score_by_author = self.get_blame_metrics(blame_by_author_obj, write_breakdown)
+        final_log_score_by_author = self.get_log_metrics(logs_by_author_obj, write_breakdown)
 
         score_by_author = {}
         for a in list(set().union(final_blame_score_by_author.keys(), final_log_score_by_author.keys())):
             score_by_author[a] = (self.ranking_constants['BLAME_SCALAR'] * final_blame_score_by_author.get(a, 0)) + (self.ranking_constants['LOG_SCALAR'] * final_log_score_by_author.get(a, 0))
 
+            if not write_breakdown:
+                continue
+
             with open(f'score_breakdown_{self.ranking_number}.txt', 'a') as file:
                 # file.write(self.ranking_constants_file_name)
                 file.write(f"{a}: BLAME_SCALAR = {self.ranking_constants['BLAME_SCALAR'] * final_blame_score_by_author.get(a, 0)}\n")
@@ -520,6 +711,48 @@ class ExpertCalculator:
 
         return score_by_author
     
+    def get_line_range_experts(self, path, start_line=None, end_line=None):
+        """
+        Scores experts for one file or a range of its lines from the line ownership index in `store`,
+        using the blame components that apply to a single file (% of lines and code score by recency).
+        Files are blamed and indexed on the first lookup, and again whenever their blob at HEAD changes;
+        paths that are not in HEAD (any index left for them is dropped) have no experts.
+
+        path: String (relative to the root of the git repo)
+        start_line: int, or None for the start of the file
+        end_line: int, or None for the end of the file
+        return OrderedDict {author_email: expert_score}
+        """
+        path = path.strip('/')
+        blob_sha = self.get_blob_sha(path)
+        if blob_sha is None:
+            if self.print_logs:
+                print(f'{path} is not in HEAD. Nothing to look up')
+            if self.store.has_line_owners(path):
+                self.store.clear_files(path)
+                self.store.commit()
+            return sort_dict_by_value({})
+
+        if self.store.get_indexed_blob_sha(path) != blob_sha:
+            if self.print_logs:
+                print(f'{path} is not indexed at HEAD yet. Blaming it...')
+            self.get_file_blame(path)
+            self.store.commit()
+
+        blame_by_author_obj = self.store.get_line_range_blame_by_author(path, start_line, end_line)
+        if len(blame_by_author_obj) == 0:
+            return sort_dict_by_value({})
+
+        percent_lines_contributed_by_author_stats = self.get_percent_current_code_by_author(blame_by_author_obj, 'num_lines_contributed')
+        score_current_code_by_author_and_recency = self.get_score_current_code_by_author_and_recency(blame_by_author_obj, 'num_lines_contributed')
+
+        score_by_author = {}
+        for a in blame_by_author_obj.keys():
+            score_by_author[a] = self.ranking_constants['LINES_CONTRIBUTED_SCALAR'] * percent_lines_contributed_by_author_stats.get(a, 0) + \
+                                 self.ranking_constants['BLAME_CODE_SCORE_SCALAR'] * score_current_code_by_author_and_recency.get(a, 0)
+
+        return sort_dict_by_value(score_by_author)
+
     def write_scores_to_output_file(self, expert_scores):
         """
         Writes ordered dict items to output file
@@ -537,14 +770,15 @@ class ExpertCalculator:
                 file.write(f'{k} {round(v, 2)}\n')
             file.write('\n')
 
-    def print_expert_scores(self, expert_scores):
+    def print_expert_scores(self, expert_scores, description=None):
         """
         Prints top `num_experts` scores
 
         expert_scores: Object {author_email: expert_score}
+        description: String (defaults to the ranking constants file name)
         returns None
         """
-        print(f'\n---- Top {self.num_experts} Experts for {self.ranking_constants_file_name}----')
+        print(f'\n---- Top {self.num_experts} Experts for {description or self.ranking_constants_file_name}----')
 
         i = 0
         for k, v in expert_scores.items():
@@ -552,6 +786,22 @@ class ExpertCalculator:
                 print(f'{k} {round(v, 2)}')
             i += 1
     
+    def print_reviewers(self, reviewers, description):
+        """
+        Prints top `num_experts` reviewers by number of reviewed commits
+
+        reviewers: Object {reviewer_email: int}
+        description: String
+        returns None
+        """
+        print(f'\n---- Top {self.num_experts} Reviewers for {description}----')
+
+        i = 0
+        for k, v in sort_dict_by_value(reviewers).items():
+            if i < self.num_experts:
+                print(f'{k} {v}')
+            i += 1
+
     def get_score_stats(self, expert_scores):
         return {
             'min': min(list(expert_scores.values())),
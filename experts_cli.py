@@ -2,9 +2,15 @@ import click
 import json
 
 from experts_calculator import ExpertCalculator
+from approximate_calculator import ApproximateExpertCalculator
+from anytime_calculator import AnytimeExpertCalculator
+from reviewer_suggester import ReviewerSuggester
+from contribution_store import ContributionStore
 from helpers import (
     setup,
-    parse_git_repo_name_from_git_url
+    parse_git_repo_name_from_git_url,
+    parse_file_query,
+    parse_patch,
 )
 
 #########################
@@ -19,25 +25,70 @@ from helpers import (
 @click.option('--action', '-a', default='calculate', help="""
     (1) calcualte -- Calculate experts for a given repo
     (2) compare -- Compare two ranking functions given two config files')
+    (3) reviewers -- Show who reviews the most changes in a given directory (optionally for one --author)
+    (4) lookup -- Show experts for one --file or line range (requires --db)
+    (5) suggest -- Suggest reviewers for each --patch from data already in --db
     """
 )
 @click.option('--ranking1_config', '-r1', default='ranking_configs/default_ranking_config.json', help="First set of constants to be used in ranking function")
 @click.option('--ranking2_config', '-r2', default='ranking_configs/default_ranking_config.json', help="Second set of constants to be used in ranking function")
-def expert_cli(github_url, directory, print_logs, num_experts, action, ranking1_config, ranking2_config):
+@click.option('--author', help='Author email to look up reviewers for (action=reviewers), or patch author to exclude when a patch has no From: header (action=suggest)')
+@click.option('--db', help='SQLite file to store parsed blame and log aggregates in')
+@click.option('--from-db', is_flag=True, help='Score from aggregates already stored in --db instead of running git')
+@click.option('--approximate', is_flag=True, help='Estimate scores from a sample of files (only used when action=calculate)')
+@click.option('--sample-rate', default=0.1, help='Fraction of files to blame when --approximate is set')
+@click.option('--commit-sample-rate', type=float, help='Fraction of each author\'s commits to fetch when --approximate is set. All commits are fetched by default')
+@click.option('--seed', type=int, help='Random seed for --approximate')
+@click.option('--time-budget', type=float, help='Return the best ranking found within this many seconds (only used when action=calculate)')
+@click.option('--priority', type=click.Choice(['size', 'recent']), default='size', help='Order to blame files in when --time-budget is set: largest or most recently changed first')
+@click.option('--stream', is_flag=True, help='Print intermediate rankings as JSON lines when --time-budget is set')
+@click.option('--file', '-f', 'file_query', help='File, optionally with a line range (e.g. src/crypto/ecdsa/ecdsa.go:120-180), for action=lookup')
+@click.option('--patch', 'patches', multiple=True, type=click.File('r'), help='Unified diff, or list of changed paths (optionally path:start-end), to suggest reviewers for. Can be repeated; - reads stdin')
+def expert_cli(github_url, directory, print_logs, num_experts, action, ranking1_config, ranking2_config, author, db, from_db, approximate, sample_rate, commit_sample_rate, seed, time_budget, priority, stream, file_query, patches):
     """
     CLI to implement the Expert feature for Github. Given a git repository,
     determines the top 3 experts for a given directory within the Golang git repo.
     """
 
+    if from_db and not db:
+        raise click.UsageError('--from-db requires --db')
+    if approximate and db:
+        raise click.UsageError('--approximate cannot be combined with --db')
+    if time_budget is not None and (db or approximate):
+        raise click.UsageError('--time-budget cannot be combined with --db or --approximate')
+    if action=='lookup' and not (file_query and db):
+        raise click.UsageError('action=lookup requires --file and --db')
+    if action=='suggest' and not (patches and db):
+        raise click.UsageError('action=suggest requires --patch and --db')
+
     git_repo_name = parse_git_repo_name_from_git_url(github_url)
-    setup(git_repo_name, github_url)
+    setup(git_repo_name, github_url, clone=not (from_db or action in ['lookup', 'suggest']), reset_outputs=action not in ['lookup', 'suggest'])
+    store = ContributionStore(db) if db else None
+
+    if action=='calculate' and approximate:
+        with open(ranking1_config) as config_file:
+            constants = json.load(config_file)
+
+        ec = ApproximateExpertCalculator(directory, git_repo_name, print_logs, num_experts, constants, ranking1_config, 1, sample_rate, commit_sample_rate, seed=seed)
+        authors = ec.get_authors_for_directory()
+        logs_by_author_obj = ec.get_logs_for_authors(authors)
+        blame_by_author_obj = ec.get_current_contributions_per_author()
+        expert_scores = ec.calculate_expert_scores(blame_by_author_obj, logs_by_author_obj)
+        ec.print_approximate_expert_scores(expert_scores, ec.get_confidence_intervals(expert_scores, logs_by_author_obj))
+    elif action=='calculate' and time_budget is not None:
+        with open(ranking1_config) as config_file:
+            constants = json.load(config_file)
 
-    if action=='calculate':
+        ec = AnytimeExpertCalculator(directory, git_repo_name, print_logs, num_experts, constants, ranking1_config, 1, time_budget, priority, stream)
+        expert_scores, completeness = ec.calculate_expert_scores_within_budget()
+        ec.print_expert_scores(expert_scores)
+        ec.print_completeness(completeness)
+    elif action=='calculate':
         with open(ranking1_config) as config_file:
             constants = json.load(config_file)
 
-        ec = ExpertCalculator(directory, git_repo_name, print_logs, num_experts, constants, ranking1_config, 1)
-        expert_scores = run_expert_calculator(ec)
+        ec = ExpertCalculator(directory, git_repo_name, print_logs, num_experts, constants, ranking1_config, 1, store)
+        expert_scores = run_expert_calculator(ec, from_db)
         ec.print_expert_scores(expert_scores)
     elif action=='compare':
         with open(ranking1_config) as config_file1:
@@ -47,12 +98,12 @@ def expert_cli(github_url, directory, print_logs, num_experts, action, ranking1_
             constants2 = json.load(config_file2)
 
         print(f'\nRunning expert calculator on {ranking1_config}')
-        ec1 = ExpertCalculator(directory, git_repo_name, print_logs, num_experts, constants1, ranking1_config, 1)
-        expert_scores1 = run_expert_calculator(ec1)
+        ec1 = ExpertCalculator(directory, git_repo_name, print_logs, num_experts, constants1, ranking1_config, 1, store)
+        expert_scores1 = run_expert_calculator(ec1, from_db)
 
         print(f'\nRunning expert calculator on {ranking2_config}')
-        ec2 = ExpertCalculator(directory, git_repo_name, print_logs, num_experts, constants2, ranking2_config, 2)
-        expert_scores2 = run_expert_calculator(ec2)
+        ec2 = ExpertCalculator(directory, git_repo_name, print_logs, num_experts, constants2, ranking2_config, 2, store)
+        expert_scores2 = run_expert_calculator(ec2, from_db)
 
         ec1.print_expert_scores(expert_scores1)
         ec2.print_expert_scores(expert_scores2)
@@ -70,8 +121,57 @@ def expert_cli(github_url, directory, print_logs, num_experts, action, ranking1_
             print('\nRanking functions returned the same top expert')
         else:
             print('\nRanking functions dit NOT return the same top expert')
+    elif action=='reviewers':
+        with open(ranking1_config) as config_file:
+            constants = json.load(config_file)
+
+        ec = ExpertCalculator(directory, git_repo_name, print_logs, num_experts, constants, ranking1_config, 1, store)
+        if from_db:
+            reviewer_index = ec.get_reviewer_index_from_store()
+        else:
+            ec.update_reviewer_index_with_new_commits()
+            reviewer_index = ec.get_reviewer_index()
+
+        if author:
+            reviewers = reviewer_index.get_reviewers_for_author_and_prefix(author, directory)
+            ec.print_reviewers(reviewers, f'{author} in {directory}')
+        else:
+            reviewers = reviewer_index.get_reviewers_for_prefix(directory)
+            ec.print_reviewers(reviewers, directory)
+
+    elif action=='lookup':
+        with open(ranking1_config) as config_file:
+            constants = json.load(config_file)
+
+        try:
+            path, start_line, end_line = parse_file_query(file_query)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--file')
+        ec = ExpertCalculator(directory, git_repo_name, print_logs, num_experts, constants, ranking1_config, 1, store)
+        expert_scores = ec.get_line_range_experts(path, start_line, end_line)
+        ec.print_expert_scores(expert_scores, file_query)
+
+    elif action=='suggest':
+        with open(ranking1_config) as config_file:
+            constants = json.load(config_file)
+
+        suggester = ReviewerSuggester(store, git_repo_name, print_logs, num_experts, constants, ranking1_config)
+        for patch in patches:
+            try:
+                patch_author, hunks_by_path = parse_patch(patch.read())
+            except ValueError as e:
+                raise click.BadParameter(f'{patch.name}: {e}', param_hint='--patch')
+            suggested_reviewers = suggester.suggest_reviewers(patch_author or author, hunks_by_path)
+            suggester.print_suggested_reviewers(suggested_reviewers, patch.name)
+
+    if store is not None:
+        store.close()
+
+def run_expert_calculator(ec, from_db=False):
+    if from_db:
+        blame_by_author_obj, logs_by_author_obj = ec.load_contributions_from_store()
+        return ec.calculate_expert_scores(blame_by_author_obj, logs_by_author_obj)
 
-def run_expert_calculator(ec):
     authors = ec.get_authors_for_directory()
     logs_by_author_obj = ec.get_logs_for_authors(authors)
     blame_by_author_obj = ec.get_current_contributions_per_author()
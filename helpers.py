@@ -1,5 +1,7 @@
 import os
+import re
 from collections import OrderedDict
+from email.utils import parseaddr
 
 ######################################
 ########## Helper Functions ##########
@@ -52,6 +54,137 @@ def get_files_in_directory(git_repo_name, directory):
     
     return files_in_dir
 
+def get_path_prefixes(path):
+    """
+    Lists every directory prefix of a path, from the repo root ('') down to the path itself
+
+    path: String (e.g. 'src/crypto/ecdsa')
+    returns [String] (e.g. ['', 'src', 'src/crypto', 'src/crypto/ecdsa'])
+    """
+    parts = [p for p in path.strip('/').split('/') if p != '']
+    return [''] + ['/'.join(parts[:i + 1]) for i in range(len(parts))]
+
+def parse_file_query(query):
+    """
+    Parses a file query of the form `path`, `path:line` or `path:start-end`.
+    Raises ValueError if the range is reversed.
+
+    query: String (e.g. 'src/crypto/ecdsa/ecdsa.go:120-180')
+    returns String, int or None, int or None
+    """
+    path, _, line_range = query.rpartition(':')
+    match = re.fullmatch(r'(\d+)(?:-(\d+))?', line_range)
+    if path == '' or match is None:
+        return query, None, None
+
+    start_line = int(match.group(1))
+    end_line = int(match.group(2)) if match.group(2) else start_line
+    if end_line < start_line:
+        raise ValueError(f'Line range {line_range} in {query} is reversed')
+
+    return path, start_line, end_line
+
+def parse_patch(text):
+    """
+    Parses the author and touched line ranges out of a patch. Accepts a unified diff (optionally with a
+    `git format-patch` `From:` header) or a list of changed paths, one per line, in `parse_file_query` format.
+    Ranges are on the old side of the diff and only cover the current lines the patch removes or
+    replaces, not the surrounding context. A pure addition is anchored to the line before it (or the
+    line after it, at the top of a file).
+
+    text: String
+    returns String or None, Object {path: [(start_line, end_line)]} (an empty list means the whole file)
+    """
+    author = None
+    hunks_by_path = OrderedDict()
+    lines = text.splitlines()
+
+    if not any(l.startswith('diff --git') or l.startswith('--- ') for l in lines):
+        for line in lines:
+            if line.strip() == '':
+                continue
+            path, start_line, end_line = parse_file_query(line.strip())
+            ranges = hunks_by_path.setdefault(path.strip('/'), [])
+            if start_line is not None:
+                ranges.append((start_line, end_line))
+
+        return author, hunks_by_path
+
+    # {path: [old line number]} of removed lines and anchors of added lines
+    changed_lines_by_path = OrderedDict()
+    path = None
+    old_line = 0
+    old_lines_left = 0
+    new_lines_left = 0
+    previous_line = ' '
+    for line in lines:
+        if old_lines_left > 0 or new_lines_left > 0:
+            # inside a hunk, lines starting with `---`/`+++` are removed/added lines, not file headers
+            if line.startswith('\\'):
+                continue
+            if line.startswith('-'):
+                changed_lines_by_path[path].append(old_line)
+            elif line.startswith('+') and not previous_line.startswith(('-', '+')):
+                anchor_line = old_line - 1 if old_line > 1 else old_line
+                if anchor_line > 0:
+                    changed_lines_by_path[path].append(anchor_line)
+
+            if not line.startswith('+'):
+                old_lines_left -= 1
+                old_line += 1
+            if not line.startswith('-'):
+                new_lines_left -= 1
+            previous_line = line
+        elif line.startswith('diff --git'):
+            path = None
+        elif line.startswith('From:') and author is None and len(changed_lines_by_path) == 0:
+            author = parseaddr(line[5:])[1] or None
+        elif line.startswith('--- '):
+            old_path = line[4:].split('\t')[0].strip()
+            path = old_path[2:] if old_path.startswith('a/') else None
+        elif line.startswith('+++ ') and path is None:
+            new_path = line[4:].split('\t')[0].strip()
+            path = new_path[2:] if new_path.startswith('b/') else new_path
+            changed_lines_by_path.setdefault(path, [])
+        elif line.startswith('+++ '):
+            changed_lines_by_path.setdefault(path, [])
+        elif line.startswith('@@') and path is not None:
+            match = re.match(r'@@ -(\d+)(?:,(\d+))? \+\d+(?:,(\d+))? @@', line)
+            if match is None:
+                continue
+            old_line = int(match.group(1))
+            old_lines_left = int(match.group(2)) if match.group(2) is not None else 1
+            new_lines_left = int(match.group(3)) if match.group(3) is not None else 1
+            previous_line = ' '
+
+    for path, changed_lines in changed_lines_by_path.items():
+        ranges = []
+        for line_number in sorted(set(changed_lines)):
+            if len(ranges) > 0 and ranges[-1][1] == line_number - 1:
+                ranges[-1] = (ranges[-1][0], line_number)
+            else:
+                ranges.append((line_number, line_number))
+        hunks_by_path[path] = ranges
+
+    return author, hunks_by_path
+
+def parse_stat_path(line):
+    """
+    Parses the path out of a `git log --stat` file line, resolving renames
+    (`dir/{old => new}/file` or `old => new`) to the new path
+
+    line: String (e.g. 'src/crypto/{ecdsa => ecdh}/ecdsa.go | 12 ++--')
+    returns String (e.g. 'src/crypto/ecdh/ecdsa.go')
+    """
+    path = line.split(' | ')[0].strip()
+    match = re.fullmatch(r'(.*)\{(.*) => (.*)\}(.*)', path)
+    if match is not None:
+        path = match.group(1) + match.group(3) + match.group(4)
+    elif ' => ' in path:
+        path = path.split(' => ')[1]
+
+    return path.replace('//', '/')
+
 def parse_email(line):
     """
     Follows GitHub's standard of <email> to parse emails
@@ -93,6 +226,27 @@ def normalize_dictionary(dictionary):
     
     return dictionary
 
+def merge_blame_objects(blame_by_author_obj, other_blame_by_author_obj):
+    """
+    Adds the counts (and files touched) of one blame object into another
+
+    blame_by_author_obj: Object {author_email: {contribution_type: {year: int}}}
+    other_blame_by_author_obj: Object {author_email: {contribution_type: {year: int}}}
+    returns Object {author_email: {contribution_type: {year: int}}}
+    """
+    for a, other_obj in other_blame_by_author_obj.items():
+        obj = blame_by_author_obj.setdefault(a, {'files_touched': []})
+        for contribution_type, counts_by_year in other_obj.items():
+            if contribution_type == 'files_touched':
+                obj['files_touched'].extend(f for f in counts_by_year if f not in obj['files_touched'])
+                continue
+
+            totals_by_year = obj.setdefault(contribution_type, {})
+            for year, value in counts_by_year.items():
+                totals_by_year[year] = totals_by_year.get(year, 0) + value
+
+    return blame_by_author_obj
+
 def sort_dict_by_value(d):
     """
     Sorts a dictionary by its values. Uses OrderedDict to maintain order
@@ -126,22 +280,26 @@ def mkdir_not_exists(dir):
     if not os.path.exists(dir):
         os.makedirs(dir)
     
-def setup(git_repo_name, github_directory):
+def setup(git_repo_name, github_directory, clone=True, reset_outputs=True):
     """
     Makes a directory to store parsed files and clones go repo if it does not already exist
 
+    clone: Boolean (False for runs that only read from the SQLite store)
+    reset_outputs: Boolean (False for runs that do not write `outputs.txt` or score breakdowns)
+
     Note: This could be adjusted to delete the go repo and download it everytime the script is
     run if we were concerned the repo would be updated often enough to change results. This could
     also be added as an option / flag to the CLI
     """
     mkdir_not_exists('parsed_files')
-    os.system('rm -f outputs.txt')
-    os.system('rm -f score_breakdown_1.txt')
-    os.system('rm -f score_breakdown_2.txt')
-    os.system('touch score_breakdown_1.txt')
-    os.system('touch score_breakdown_2.txt')
+    if reset_outputs:
+        os.system('rm -f outputs.txt')
+        os.system('rm -f score_breakdown_1.txt')
+        os.system('rm -f score_breakdown_2.txt')
+        os.system('touch score_breakdown_1.txt')
+        os.system('touch score_breakdown_2.txt')
 
-    if not os.path.exists(git_repo_name):
+    if clone and not os.path.exists(git_repo_name):
         os.system(f'git clone {github_directory}')
 
 def parse_git_repo_name_from_git_url(github_url):
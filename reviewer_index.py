@@ -0,0 +1,155 @@
+import os
+import json
+
+from helpers import get_path_prefixes
+
+class ReviewerIndex:
+    """
+    Persisted index of parsed `Reviewed-by:` trailers, keyed by path prefix, author and reviewer.
+
+    Counts are stored two ways so that the common questions are a single dict lookup:
+        - counts: {path_prefix: {author: {reviewer: int}}} ("who reviews this author's changes here")
+        - reviewers_by_prefix: {path_prefix: {reviewer: int}} ("who reviews most in this directory")
+
+    Every count is a number of commits. `last_indexed_shas` holds, per indexed directory, the HEAD up
+    to which every commit touching it has been counted for the directory and all its sub-directories
+    (not its parents), so later updates only need the commits made since then.
+    """
+    def __init__(self, index_file_name):
+        self.index_file_name = index_file_name
+        self.counts = {}
+        self.reviewers_by_prefix = {}
+        self.last_indexed_shas = {}
+
+    @classmethod
+    def load(cls, index_file_name):
+        """
+        Loads an index from disk, or returns an empty one if it has not been built yet
+
+        index_file_name: String
+        returns ReviewerIndex
+        """
+        index = cls(index_file_name)
+        if os.path.exists(index_file_name):
+            with open(index_file_name, 'r') as file:
+                data = json.load(file)
+            index.counts = data['counts']
+            index.reviewers_by_prefix = data['reviewers_by_prefix']
+            index.last_indexed_shas = data['last_indexed_shas']
+
+        return index
+
+    def save(self):
+        """
+        Writes the index to `index_file_name`
+
+        returns None
+        """
+        with open(self.index_file_name, 'w') as file:
+            json.dump({
+                'counts': self.counts,
+                'reviewers_by_prefix': self.reviewers_by_prefix,
+                'last_indexed_shas': self.last_indexed_shas,
+            }, file)
+
+    def update(self, logs_by_author_obj, directory):
+        """
+        Adds reviews from newly parsed commits to the index. Each commit is credited to `directory`
+        and to every sub-directory of it that holds a file the commit changed. The caller makes sure
+        no commit is passed in twice for the same directory (see `get_last_indexed_sha`).
+
+        logs_by_author_obj: Object {author_email: [{commit_stats_obj}]}
+        directory: String
+        returns int (number of reviewed commits added)
+        """
+        directory = directory.strip('/')
+        num_updated_commits = 0
+        for a, stats_arr in logs_by_author_obj.items():
+            for s in stats_arr:
+                if len(s.get('reviewed_by', [])) == 0:
+                    continue
+
+                prefixes = {directory}
+                for f in s.get('files_changed', []):
+                    prefixes.update(p for p in get_path_prefixes(os.path.dirname(f)) if self._is_under(p, directory))
+
+                for p in prefixes:
+                    for r in s['reviewed_by']:
+                        self._increment(self.counts.setdefault(p, {}), a, r)
+                        self._increment(self.reviewers_by_prefix, p, r)
+
+                num_updated_commits += 1
+
+        return num_updated_commits
+
+    def clear(self, directory):
+        """
+        Drops all counts and HEADs for `directory` and its sub-directories, before re-indexing it from scratch
+
+        directory: String
+        returns None
+        """
+        directory = directory.strip('/')
+        for dictionary in [self.counts, self.reviewers_by_prefix, self.last_indexed_shas]:
+            for p in [p for p in dictionary.keys() if self._is_under(p, directory)]:
+                del dictionary[p]
+
+    def get_last_indexed_sha(self, directory):
+        """
+        HEAD up to which all commits under `directory` are indexed, taken from the directory itself
+        or its closest indexed parent (indexing a parent credits every sub-directory too)
+
+        directory: String
+        returns String or None
+        """
+        for prefix in reversed(get_path_prefixes(directory)):
+            if prefix in self.last_indexed_shas.keys():
+                return self.last_indexed_shas[prefix]
+
+        return None
+
+    def has_indexed_sub_directories(self, directory):
+        """
+        Whether a sub-directory of `directory` has been indexed up to its own HEAD
+
+        directory: String
+        returns Boolean
+        """
+        directory = directory.strip('/')
+        return any(p != directory and self._is_under(p, directory) for p in self.last_indexed_shas.keys())
+
+    def set_last_indexed_sha(self, directory, commit_sha):
+        """
+        Records that all commits under `directory` up to `commit_sha` are indexed
+
+        directory: String
+        commit_sha: String
+        returns None
+        """
+        self.last_indexed_shas[directory.strip('/')] = commit_sha
+
+    def get_reviewers_for_prefix(self, prefix):
+        """
+        Number of commits under `prefix` reviewed by each reviewer
+
+        prefix: String
+        returns Object {reviewer_email: int}
+        """
+        return dict(self.reviewers_by_prefix.get(prefix.strip('/'), {}))
+
+    def get_reviewers_for_author_and_prefix(self, author, prefix):
+        """
+        Number of commits by `author` under `prefix` reviewed by each reviewer
+
+        author: String
+        prefix: String
+        returns Object {reviewer_email: int}
+        """
+        return dict(self.counts.get(prefix.strip('/'), {}).get(author, {}))
+
+    def _is_under(self, path, directory):
+        return directory == '' or path == directory or path.startswith(f'{directory}/')
+
+    def _increment(self, dictionary, key, sub_key):
+        counts = dictionary.setdefault(key, {})
+        counts[sub_key] = counts.get(sub_key, 0) + 1
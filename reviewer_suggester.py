@@ -0,0 +1,138 @@
+import os
+import json
+
+from experts_calculator import ExpertCalculator
+from helpers import (
+    get_path_prefixes,
+    normalize_dictionary,
+    sort_dict_by_value,
+)
+
+class ReviewerSuggester:
+    """
+    Suggests reviewers for many patches from data already in a `ContributionStore`, without running git.
+
+    Each touched file contributes, weighted by the number of current lines the patch removes or
+    replaces (see `parse_patch`; 1 for a whole or new file):
+        - the normalized expert scores (`calculate_expert_scores`) of its directory, or of the closest
+          parent directory the store has data for, cached per directory in memory and in the store
+        - each author's share of the hunk lines in the line ownership index, when the file is indexed
+    """
+    def __init__(self, store, git_repo_name, print_logs, num_experts, ranking_constants, ranking_constants_file_name):
+        self.store = store
+        self.git_repo_name = git_repo_name
+        self.print_logs = print_logs
+        self.num_experts = num_experts
+        self.ranking_constants = ranking_constants
+        self.ranking_constants_file_name = ranking_constants_file_name
+        self.ranking_constants_key = json.dumps(ranking_constants, sort_keys=True)
+
+        # {directory: {author_email: normalized expert_score}}
+        self.directory_expert_scores = {}
+
+    def suggest_reviewers(self, patch_author, hunks_by_path):
+        """
+        Ranks reviewers for one patch, excluding its author (emails are compared case-insensitively)
+
+        patch_author: String or None
+        hunks_by_path: Object {path: [(start_line, end_line)]} (see `parse_patch`)
+        returns OrderedDict {author_email: score}
+        """
+        score_by_author = {}
+        total_weight = 0
+
+        for path, hunks in hunks_by_path.items():
+            weight = sum(end_line - start_line + 1 for start_line, end_line in hunks) or 1
+            total_weight += weight
+
+            for a, score in self.get_directory_expert_scores(os.path.dirname(path)).items():
+                score_by_author[a] = score_by_author.get(a, 0) + weight * score
+
+            for a, share in self.get_hunk_ownership(path, hunks).items():
+                score_by_author[a] = score_by_author.get(a, 0) + weight * share
+
+        if patch_author is not None:
+            for a in [a for a in score_by_author.keys() if a.lower() == patch_author.lower()]:
+                score_by_author.pop(a)
+        for a in score_by_author.keys():
+            score_by_author[a] /= float(total_weight)
+
+        return sort_dict_by_value(score_by_author)
+
+    def get_directory_expert_scores(self, directory):
+        """
+        Normalized expert scores for `directory`, falling back to its closest parent with data in the store
+
+        directory: String
+        returns Object {author_email: float}
+        """
+        for prefix in reversed(get_path_prefixes(directory)):
+            if prefix not in self.directory_expert_scores.keys():
+                self.directory_expert_scores[prefix] = self.calculate_directory_expert_scores(prefix)
+
+            if len(self.directory_expert_scores[prefix]) > 0:
+                return self.directory_expert_scores[prefix]
+
+        return {}
+
+    def calculate_directory_expert_scores(self, directory):
+        """
+        Reads cached expert scores for a directory from the store, or calculates and caches them
+
+        directory: String
+        returns Object {author_email: float}
+        """
+        expert_scores = self.store.get_expertise_scores(self.ranking_constants_key, directory)
+        if expert_scores is not None:
+            return expert_scores
+
+        if self.print_logs:
+            print(f'Calculating expert scores for {directory or "<root>"}...')
+
+        ec = ExpertCalculator(directory, self.git_repo_name, self.print_logs, self.num_experts, self.ranking_constants, self.ranking_constants_file_name, 1, self.store)
+        blame_by_author_obj, logs_by_author_obj = ec.load_contributions_from_store()
+
+        if len(blame_by_author_obj) == 0 and len(logs_by_author_obj) == 0:
+            return {}
+
+        expert_scores = normalize_dictionary(dict(ec.calculate_expert_scores(blame_by_author_obj, logs_by_author_obj, write_breakdown=False)))
+        self.store.write_expertise_scores(self.ranking_constants_key, directory, expert_scores)
+        self.store.commit()
+
+        return expert_scores
+
+    def get_hunk_ownership(self, path, hunks):
+        """
+        Share of the changed lines each author currently owns. Empty if the file is not in the line
+        ownership index (it is not blamed here, so batches never run git).
+
+        path: String
+        hunks: [(start_line, end_line)] (an empty list means the whole file)
+        returns Object {author_email: float}
+        """
+        if not self.store.has_line_owners(path):
+            return {}
+
+        num_lines_by_author = {}
+        for start_line, end_line in (hunks or [(None, None)]):
+            blame_by_author_obj = self.store.get_line_range_blame_by_author(path, start_line, end_line)
+            for a, obj in blame_by_author_obj.items():
+                num_lines_by_author[a] = num_lines_by_author.get(a, 0) + sum(obj['num_lines_contributed'].values())
+
+        return normalize_dictionary(num_lines_by_author)
+
+    def print_suggested_reviewers(self, suggested_reviewers, description):
+        """
+        Prints top `num_experts` suggested reviewers
+
+        suggested_reviewers: OrderedDict {author_email: score}
+        description: String
+        returns None
+        """
+        print(f'\n---- Top {self.num_experts} Suggested Reviewers for {description}----')
+
+        i = 0
+        for k, v in suggested_reviewers.items():
+            if i < self.num_experts:
+                print(f'{k} {round(v, 2)}')
+            i += 1
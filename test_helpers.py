@@ -0,0 +1,91 @@
+import pytest
+
+from helpers import parse_file_query, parse_patch, parse_stat_path
+
+TXTAR_PATCH = """From 1234567890abcdef Mon Sep 17 00:00:00 2001
+From: foo@bar.com
+Subject: [PATCH] cmd/go: drop go.mod from test script
+
+---
+diff --git a/src/cmd/go/testdata/script/mod.txt b/src/cmd/go/testdata/script/mod.txt
+index 1111111..2222222 100644
+--- a/src/cmd/go/testdata/script/mod.txt
++++ b/src/cmd/go/testdata/script/mod.txt
+@@ -1,3 +1,1 @@
+ go build
+--- go.mod --
+-module m
+@@ -40,2 +38,3 @@ go build
+ -- main.go --
+-package main
++package main
++
++func main() {}
+diff --git a/src/cmd/go/alldocs.go b/src/cmd/go/alldocs.go
+--- a/src/cmd/go/alldocs.go
++++ b/src/cmd/go/alldocs.go
+@@ -7 +7 @@
+-// old
++// new
+\\ No newline at end of file
+"""
+
+def test_parse_patch_removed_header_like_line_in_hunk():
+    author, hunks_by_path = parse_patch(TXTAR_PATCH)
+
+    assert list(hunks_by_path.items()) == [
+        ('src/cmd/go/testdata/script/mod.txt', [(2, 3), (41, 41)]),
+        ('src/cmd/go/alldocs.go', [(7, 7)]),
+    ]
+
+def test_parse_patch_skips_context_lines():
+    author, hunks_by_path = parse_patch("""diff --git a/src/n.go b/src/n.go
+--- a/src/n.go
++++ b/src/n.go
+@@ -1,2 +1,3 @@
++// header
+ package n
+ 
+@@ -3,3 +4,4 @@ func n() {
+ \ta()
+ \tb()
+ }
++// appended
+diff --git a/src/new.go b/src/new.go
+new file mode 100644
+--- /dev/null
++++ b/src/new.go
+@@ -0,0 +1 @@
++package n
+""")
+
+    # an append is anchored to the line before it, an insertion at the top to the line after it
+    assert dict(hunks_by_path) == {'src/n.go': [(1, 1), (5, 5)], 'src/new.go': []}
+
+def test_parse_patch_bare_from_address():
+    author, hunks_by_path = parse_patch(TXTAR_PATCH)
+    assert author == 'foo@bar.com'
+
+    author, hunks_by_path = parse_patch(TXTAR_PATCH.replace('From: foo@bar.com', 'From: Foo Bar <Foo@Bar.com>'))
+    assert author == 'Foo@Bar.com'
+
+def test_parse_patch_path_list():
+    author, hunks_by_path = parse_patch('src/net/http/server.go:120-180\n/src/os/file.go\n')
+
+    assert author is None
+    assert dict(hunks_by_path) == {'src/net/http/server.go': [(120, 180)], 'src/os/file.go': []}
+
+def test_parse_stat_path_renames():
+    assert parse_stat_path('src/crypto/ecdsa/ecdsa.go | 12 ++--') == 'src/crypto/ecdsa/ecdsa.go'
+    assert parse_stat_path('src/crypto/{ecdsa => ecdh}/ecdsa.go | 0') == 'src/crypto/ecdh/ecdsa.go'
+    assert parse_stat_path('src/{ => internal}/x.go | 0') == 'src/internal/x.go'
+    assert parse_stat_path('src/{internal => }/x.go | 0') == 'src/x.go'
+    assert parse_stat_path('a.go => src/b.go | 0') == 'src/b.go'
+
+def test_parse_file_query():
+    assert parse_file_query('src/os/file.go:120-180') == ('src/os/file.go', 120, 180)
+    assert parse_file_query('src/os/file.go:7') == ('src/os/file.go', 7, 7)
+    assert parse_file_query('src/os/file.go') == ('src/os/file.go', None, None)
+
+    with pytest.raises(ValueError):
+        parse_file_query('src/os/file.go:5-2')
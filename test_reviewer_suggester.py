@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from contribution_store import ContributionStore
+from reviewer_suggester import ReviewerSuggester
+
+RANKING_CONSTANTS = {'BLAME_SCALAR': 1, 'LOG_SCALAR': 1}
+
+@pytest.fixture
+def store(tmp_path):
+    store = ContributionStore(str(tmp_path / 'experts.db'))
+    ranking_constants_key = json.dumps(RANKING_CONSTANTS, sort_keys=True)
+    store.write_expertise_scores(ranking_constants_key, 'src/a', {'alice@x.com': 0.5, 'bob@x.com': 0.5})
+    store.write_expertise_scores(ranking_constants_key, 'src/b', {'carol@x.com': 1.0})
+    store.write_line_owners('src/a/f.go', [('alice@x.com', 2020, 1), ('bob@x.com', 2021, 1), ('bob@x.com', 2021, 1)], 'blob')
+    store.commit()
+
+    yield store
+    store.close()
+
+def test_suggest_reviewers_excludes_author_and_weights_by_changed_lines(store):
+    suggester = ReviewerSuggester(store, 'repo', False, 3, RANKING_CONSTANTS, 'ranking_config.json')
+
+    # f.go changes 2 lines, both owned by bob; g.go (not indexed) 1 line
+    suggested_reviewers = suggester.suggest_reviewers('ALICE@x.com', {'src/a/f.go': [(2, 3)], 'src/b/g.go': [(1, 1)]})
+
+    assert list(suggested_reviewers.keys()) == ['bob@x.com', 'carol@x.com']
+    assert suggested_reviewers['bob@x.com'] == pytest.approx((2 * 0.5 + 2 * 1.0) / 3)
+    assert suggested_reviewers['carol@x.com'] == pytest.approx(1.0 / 3)